@@ -1,8 +1,12 @@
 import streamlit as st
 import fitz
-import tempfile
+import numpy as np
 import pandas as pd
-from collections import Counter
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import hashlib
+import joblib
 import os
 
 st.set_page_config(page_title="Document Format Validation", layout="wide")
@@ -12,70 +16,124 @@ st.title("🔍 Intelligent Document Format Validation")
 if "trained_un_combos" not in st.session_state:
     st.session_state.trained_un_combos = Counter()
 
+# --- Persistent training cache, keyed by the uploaded file set ---
+_TRAIN_CACHE_DIR = ".train_cache"
+
+def _training_cache_path(payloads):
+    """Cache path for a training set; order of uploads does not matter."""
+    digests = sorted(hashlib.blake2b(d, digest_size=16).hexdigest() for d in payloads)
+    key = hashlib.blake2b("".join(digests).encode(), digest_size=16).hexdigest()
+    return os.path.join(_TRAIN_CACHE_DIR, f"{key}.joblib")
+
 # --- Utility: Convert int color to hex ---
+_HEX = [f"{i:02X}" for i in range(256)]
+
 def int_to_hex(color_int):
-    """Convert int color (from PyMuPDF) to hex"""
-    r = (color_int >> 16) & 255
-    g = (color_int >> 8) & 255
-    b = color_int & 255
-    return f"#{r:02X}{g:02X}{b:02X}"
-
-# --- Utility: Extract Text Formatting Combos ---
-def extract_formatting_combos(pdf_path):
-    """Extract text formatting combos from a PDF using PyMuPDF."""
-    combos = Counter()
-    detailed_chars = []
-
-    doc = fitz.open(pdf_path)
-    for page_num, page in enumerate(doc):
-        dict_text = page.get_text("dict")
-        for block in dict_text["blocks"]:
-            for line in block.get("lines", []):
-                for span in line.get("spans", []):
-                    text = span.get("text", "").strip()
-                    if not text:
-                        continue
-                    font = span.get("font", "Unknown")
-                    size = round(span.get("size", 0), 1)
-                    color = span.get("color", 0)
-                    color_hex = int_to_hex(color)
-                    flags = span.get("flags", "")
-                    ascender = span.get("ascender", 0)
-                    descender = span.get("descender", 0)
-                    bbox = span.get("bbox", [])  # Bounding box
-
-                    un_com = f"{size}_{flags}_{font}_{color_hex}_{ascender}_{descender}"
-                    combos[un_com] += 1
-
-                    detailed_chars.append({
-                        "text": text,
-                        "page": page_num,
-                        "un_com": un_com,
-                        "color": color_hex,
-                        "bbox": bbox,
-                    })
-    return combos, detailed_chars
-
-# --- Utility: Extract Image Combos ---
-def extract_image_combos(pdf_path):
-    """Extract image combos from a PDF using PyMuPDF."""
-    combos = Counter()
-
-    doc = fitz.open(pdf_path)
-    for page in doc:
-        images = page.get_images(full=True)
-        for img in images:
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            width = base_image.get("width", 0)
-            height = base_image.get("height", 0)
-            ext = base_image.get("ext", "unk")
-            cs = base_image.get("colorspace", "unk")
-            bpc = base_image.get("bpc", 0)
-            size = len(base_image.get("image", b""))
-            un_comb_img = f"IMG_{width}_{height}_{ext}_{cs}_0_0_{bpc}_{size}"
-            combos[un_comb_img] += 1
-    return combos
+    """Convert int color (from PyMuPDF) to hex via a byte lookup table"""
+    return "#" + _HEX[(color_int >> 16) & 255] + _HEX[(color_int >> 8) & 255] + _HEX[color_int & 255]
+
+# --- Utility: Infer image extension from the PDF stream filter ---
+_FILTER_EXT = {
+    "DCTDecode": "jpeg",
+    "JPXDecode": "jpx",
+    "JBIG2Decode": "jb2",
+    "CCITTFaxDecode": "fax",
+    "FlateDecode": "png",
+}
+
+def _image_ext(doc, xref):
+    """Map an image xref's /Filter to a file extension without decoding it."""
+    _, filt = doc.xref_get_key(xref, "Filter")
+    for name, ext in _FILTER_EXT.items():
+        if name in filt:
+            return ext
+    return "unk"
+
+# --- Utility: Extract Text + Image Combos in a Single Pass ---
+def extract_all_combos_from_bytes(data, collect_details=True):
+    """Extract text formatting combos and image combos from PDF bytes in one pass.
+
+    Span details come back as parallel lists (one entry per span) rather than
+    one dict per span, so downstream filtering can run over whole columns.
+    Training only needs the combo counts, so it passes collect_details=False
+    to skip filling the per-span columns entirely.
+    """
+    text_combos = Counter()
+    image_combos = Counter()
+    detailed_chars = {"texts": [], "pages": [], "un_coms": [], "colors": [], "bboxes": []}
+
+    # Hoist bound methods out of the per-span hot loop
+    add_text = detailed_chars["texts"].append
+    add_page = detailed_chars["pages"].append
+    add_un_com = detailed_chars["un_coms"].append
+    add_color = detailed_chars["colors"].append
+    add_bbox = detailed_chars["bboxes"].append
+
+    # Text-only flags: keep dict mode from embedding image binaries per block
+    text_flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page_num, page in enumerate(doc):
+            dict_text = page.get_text("dict", flags=text_flags)
+            for block in dict_text["blocks"]:
+                for line in block.get("lines", ()):
+                    for span in line.get("spans", ()):
+                        text = span.get("text", "").strip()
+                        if not text:
+                            continue
+                        font = span.get("font", "Unknown")
+                        size = round(span.get("size", 0), 1)
+                        color = span.get("color", 0)
+                        flags = span.get("flags", "")
+                        ascender = span.get("ascender", 0)
+                        descender = span.get("descender", 0)
+                        bbox = span.get("bbox", (0, 0, 0, 0))  # Bounding box
+
+                        # Tuple keys hash in C; hex conversion is deferred to display
+                        un_com = (size, flags, font, color, ascender, descender)
+                        text_combos[un_com] += 1
+
+                        if collect_details:
+                            add_text(text)
+                            add_page(page_num)
+                            add_un_com(un_com)
+                            add_color(color)
+                            add_bbox(bbox)
+
+            # get_image_info reads stream metadata without decompressing the image
+            for info in page.get_image_info(xrefs=True):
+                xref = info.get("xref", 0)
+                width = info.get("width", 0)
+                height = info.get("height", 0)
+                cs = info.get("cs-name", "unk")
+                bpc = info.get("bpc", 0)
+                size = info.get("size", 0)
+                ext = _image_ext(doc, xref) if xref else "unk"
+                if not size and xref:
+                    # Older PyMuPDF builds omit the stream size; decode as a fallback
+                    size = len(doc.extract_image(xref).get("image", b""))
+                un_comb_img = ("IMG", width, height, ext, cs, 0, 0, bpc, size)
+                image_combos[un_comb_img] += 1
+
+    return text_combos, detailed_chars, image_combos
+
+# --- Utility: Memoized extraction keyed by content hash ---
+# Raw bytes make poor cache keys, so the lru_cache is keyed by a content
+# digest and the payload is stashed only for the duration of the call.
+_pending_payloads = {}
+
+@functools.lru_cache(maxsize=64)
+def _extract_all_combos_by_digest(digest):
+    return extract_all_combos_from_bytes(_pending_payloads[digest])
+
+def extract_all_combos_cached(data):
+    """Memoized extract_all_combos_from_bytes, so re-uploads parse instantly."""
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    _pending_payloads[digest] = data
+    try:
+        return _extract_all_combos_by_digest(digest)
+    finally:
+        del _pending_payloads[digest]
 
 # ===========================
 #  STEP 1: TRAINING
@@ -87,19 +145,30 @@ if st.button("📚 Train Model"):
     if not train_files:
         st.warning("Please upload at least one PDF to train.")
     else:
-        st.session_state.trained_un_combos = Counter()
-        for file in train_files:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(file.read())
-                text_combos, _ = extract_formatting_combos(tmp.name)
-                image_combos = extract_image_combos(tmp.name)
-                combined_combos = text_combos + image_combos
-                st.session_state.trained_un_combos.update(combined_combos)
+        payloads = [file.read() for file in train_files]
+        cache_path = _training_cache_path(payloads)
+
+        if os.path.exists(cache_path):
+            # Same file set as an earlier session — reload the trained model
+            st.session_state.trained_un_combos = joblib.load(cache_path)
+        else:
+            st.session_state.trained_un_combos = Counter()
+            # Each PDF is independent, so parse them in worker processes (PyMuPDF holds the GIL)
+            extract_counts_only = functools.partial(extract_all_combos_from_bytes, collect_details=False)
+            with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 4)) as ex:
+                for text_combos, _, image_combos in ex.map(extract_counts_only, payloads):
+                    st.session_state.trained_un_combos.update(text_combos)
+                    st.session_state.trained_un_combos.update(image_combos)
+
+            os.makedirs(_TRAIN_CACHE_DIR, exist_ok=True)
+            joblib.dump(st.session_state.trained_un_combos, cache_path)
 
         st.success("✅ Model trained!")
-        df_train = pd.DataFrame(st.session_state.trained_un_combos.items(), columns=["Combo", "Count"])
-        # Optional: Show training combos
-        # st.dataframe(df_train.sort_values(by="Count", ascending=False), use_container_width=True)
+
+# Optional: Show training combos (DataFrame is built only when requested)
+if st.session_state.trained_un_combos and st.checkbox("Show training combos"):
+    df_train = pd.DataFrame(st.session_state.trained_un_combos.items(), columns=["Combo", "Count"])
+    st.dataframe(df_train.sort_values(by="Count", ascending=False), use_container_width=True)
 
 # ===========================
 #  STEP 2: TESTING
@@ -113,12 +182,10 @@ if st.button("🚨 Validate Test Document"):
     elif not test_file:
         st.warning("Please upload a test PDF.")
     else:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(test_file.read())
-            test_pdf_path = tmp.name
-            test_text_combos, detailed_chars = extract_formatting_combos(test_pdf_path)
-            test_image_combos = extract_image_combos(test_pdf_path)
-            test_combos = test_text_combos + test_image_combos
+        test_data = test_file.read()
+        test_text_combos, detailed_chars, test_image_combos = extract_all_combos_cached(test_data)
+        test_combos = Counter(test_text_combos)
+        test_combos.update(test_image_combos)
 
         trained_set = set(st.session_state.trained_un_combos.keys())
         test_set = set(test_combos.keys())
@@ -133,29 +200,35 @@ if st.button("🚨 Validate Test Document"):
         # st.subheader("🎯 Fraud Risk Score")
         # st.metric(label="Fraud Score", value=f"{fraud_score}%", delta=None)
 
-        # Collect suspicious characters
-        suspicious_chars = [c for c in detailed_chars if c["un_com"] in unexpected]
+        # Collect suspicious characters via a boolean mask over the span columns
+        un_coms = detailed_chars["un_coms"]
+        mask = np.fromiter((u in unexpected for u in un_coms), dtype=bool, count=len(un_coms))
 
-        if suspicious_chars:
+        if mask.any():
             # st.subheader("🚩 Suspicious Characters (Unexpected Formatting)")
             st.subheader("🚩 Suspicious Content Found!!")
-            # sus_df = pd.DataFrame(suspicious_chars)
+            sus_pages = np.asarray(detailed_chars["pages"])[mask]
+            sus_bboxes = np.asarray(detailed_chars["bboxes"], dtype=float)[mask]
+            # sus_df = pd.DataFrame({"text": np.asarray(detailed_chars["texts"])[mask], "page": sus_pages})
             # st.dataframe(sus_df, use_container_width=True)
 
-            # Annotate PDF with red boxes
-            doc = fitz.open(test_pdf_path)
-            for char in suspicious_chars:
-                page = doc[char["page"]]
-                rect = fitz.Rect(char["bbox"])
-                page.draw_rect(rect, color=(1, 0, 0), width=1.5)
+            # Annotate PDF with red boxes (reuse the bytes already read),
+            # drawing all rects for a page in one visit
+            by_page = defaultdict(list)
+            for page_num, bbox in zip(sus_pages.tolist(), sus_bboxes.tolist()):
+                by_page[page_num].append(bbox)
+
+            doc = fitz.open(stream=test_data, filetype="pdf")
+            for page_num, boxes in by_page.items():
+                page = doc[page_num]
+                for bbox in boxes:
+                    page.draw_rect(fitz.Rect(bbox), color=(1, 0, 0), width=1.5)
 
-            annotated_path = test_pdf_path.replace(".pdf", "_annotated.pdf")
-            doc.save(annotated_path)
+            annotated_bytes = doc.tobytes(garbage=4, deflate=True)
 
             st.success("🔴 Inconsistencies highlighted in annotated PDF.")
 
-            with open(annotated_path, "rb") as f:
-                st.download_button("⬇️ Download Annotated PDF", f, file_name="annotated_test.pdf", mime="application/pdf")
+            st.download_button("⬇️ Download Annotated PDF", annotated_bytes, file_name="annotated_test.pdf", mime="application/pdf")
         else:
             st.success("✅ No unexpected formatting found in test document.")
 
@@ -1,40 +1,58 @@
 import streamlit as st
+import functools
 import hashlib
 import os
 import fitz  # PyMuPDF
 import pytesseract
 import cv2
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
 # ---------- Utilities ----------
 
+# Hashing and text extraction are cached per (path, mtime, size) so that
+# re-running "Check for Duplicates" in the same session only touches
+# source files that changed since the last run.
+
+def _stat_key(file_path):
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
 def compute_hash(file_path, algo='sha256'):
-    hash_func = hashlib.new(algo)
+    mtime_ns, size = _stat_key(file_path)
+    return _compute_hash_cached(file_path, mtime_ns, size, algo)
+
+@functools.lru_cache(maxsize=256)
+def _compute_hash_cached(file_path, mtime_ns, size, algo):
     with open(file_path, 'rb') as f:
-        while chunk := f.read(8192):
-            hash_func.update(chunk)
-    return hash_func.hexdigest()
+        # file_digest runs the whole read/update loop in C
+        return hashlib.file_digest(f, algo).hexdigest()
 
 def extract_text_from_pdf(file_path):
-    text = ""
     with fitz.open(file_path) as doc:
-        for page in doc:
-            text += page.get_text()
-    return text
+        # Plain text with extraction flags off — TF-IDF only needs raw
+        # tokens, so skip ligature/whitespace reconstruction work
+        return "".join(page.get_text("text", flags=0) for page in doc)
 
 def extract_text_from_image(file_path):
     try:
-        img = cv2.imread(file_path)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        gray = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
-        gray = cv2.medianBlur(gray, 3)
+        # Decode straight to grayscale and filter in place to skip the
+        # BGR->GRAY conversion and per-step reallocations
+        gray = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
+        cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU, dst=gray)
+        cv2.medianBlur(gray, 3, dst=gray)
         return pytesseract.image_to_string(gray)
     except Exception as e:
         return ""
 
 def extract_text(file_path):
+    mtime_ns, size = _stat_key(file_path)
+    return _extract_text_cached(file_path, mtime_ns, size)
+
+@functools.lru_cache(maxsize=256)
+def _extract_text_cached(file_path, mtime_ns, size):
     ext = os.path.splitext(file_path)[-1].lower()
     try:
         if ext == '.pdf':
@@ -46,18 +64,25 @@ def extract_text(file_path):
     except Exception:
         return ""
 
-def compute_cosine_similarity(text1, text2):
-    # Clean and check for empty or meaningless text
-    text1 = text1.strip()
-    text2 = text2.strip()
-    if not text1 or not text2:
-        return 0.0  # Avoid TF-IDF error
+def compute_cosine_similarities(target_text, source_texts):
+    """Fit TF-IDF once over all documents and score every source against the target."""
+    target_text = target_text.strip()
+    stripped = [t.strip() for t in source_texts]
+    scores = [0.0] * len(stripped)
+    if not target_text:
+        return scores  # Avoid TF-IDF error
+    non_empty = [i for i, t in enumerate(stripped) if t]
+    if not non_empty:
+        return scores
     try:
         vectorizer = TfidfVectorizer()
-        vectors = vectorizer.fit_transform([text1, text2])
-        return cosine_similarity(vectors[0], vectors[1])[0][0]
+        vectors = vectorizer.fit_transform([target_text] + [stripped[i] for i in non_empty])
+        sims = cosine_similarity(vectors[0:1], vectors[1:])[0]
+        for i, sim in zip(non_empty, sims):
+            scores[i] = float(sim)
     except ValueError:
-        return 0.0  # In case of stopword-only documents or other TF-IDF issues
+        pass  # In case of stopword-only documents or other TF-IDF issues
+    return scores
 
 # ---------- Streamlit UI ----------
 
@@ -100,16 +125,28 @@ if st.button("🔍 Check for Duplicates"):
         results = []
         found_exact_duplicate = False
 
-        # Precompute for target file
+        # Hash everything first; hash-equal files are guaranteed duplicates,
+        # so only the remaining files need OCR/TF-IDF at all
         target_hash = compute_hash(target_path)
-        target_text = extract_text(target_path)
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            source_hashes = list(ex.map(compute_hash, source_files))
+
+        non_matching = [p for p, h in zip(source_files, source_hashes) if h != target_hash]
+
+        # Extract text in parallel; hashing is I/O-bound and OCR runs in a
+        # tesseract subprocess, so threads scale across files
+        target_text = extract_text(target_path) if non_matching else ""
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            non_matching_texts = list(ex.map(extract_text, non_matching))
 
-        for file_path in source_files:
-            source_hash = compute_hash(file_path)
-            source_text = extract_text(file_path)
-            similarity_score = compute_cosine_similarity(source_text, target_text)
+        # Fit one TF-IDF vocabulary over every document instead of per pair
+        similarity_by_path = dict(
+            zip(non_matching, compute_cosine_similarities(target_text, non_matching_texts))
+        )
 
+        for file_path, source_hash in zip(source_files, source_hashes):
             is_exact = source_hash == target_hash
+            similarity_score = 1.0 if is_exact else similarity_by_path[file_path]
             if is_exact:
                 found_exact_duplicate = True
                 st.markdown(